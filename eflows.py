@@ -1,48 +1,34 @@
-import argparse, csv
+import argparse, csv, os, shutil, tempfile
 import numpy as np
-from eflows.load import load_consumption, load_balance, load_gdp
-from eflows.models import Base, Resource, NodeSector, Node, Flow, resource_source_nodes, resource_sink_nodes
+from eflows.load import load_consumption, load_balance, load_gdp, is_empty_flow
+from eflows.models import Base, Resource, NodeSector, Node, Flow, Year, resource_source_nodes, resource_sink_nodes
 import eflows.template_functions as tf
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func
 from sqlalchemy.orm import sessionmaker
 from mako.template import Template
-from weasyprint import HTML
+from eflows.report import compile_sections
 import matplotlib.pyplot as plt
 from matplotlib.sankey import Sankey
 from matplotlib.patches import Rectangle
 
-parser = argparse.ArgumentParser(description='Loads, stores, and summarizes national energy flow data')
-
-parser.add_argument('--load-data', help="Loads in national data from balance.txt and consumption.txt in current directory, saving it out to eflows.db", action="store_true")
-parser.add_argument('--generate-plots', help="Generates Sankey diagrams and time-series plots based on data stored in eflows.db", action="store_true")
-parser.add_argument('--compile-report', help="Generates summary PDF with balance tables, Sankey diagrams, etc based on data stored in eflows.db and pre-generated SVG plots", action="store_true")
-parser.add_argument('--run-all', help="Loads data into database, generates plots, and outputs summary report PDF", action="store_true")
-
-args = parser.parse_args()
-
-engine = create_engine('sqlite:///eflows.db')
-Session = sessionmaker(bind=engine)
-
-report_years = [1973, 1990, 2010, 2030, 2050]
-
-if args.load_data or args.run_all:
+def populate_database(db_engine, balance_metadata, balance_values, consumption, consumption_categories, sparse_flows=False):
 
     print('Clearing existing energy flows database...')
-    Base.metadata.drop_all(engine)
+    Base.metadata.drop_all(db_engine)
 
     print('Building energy flows database schema...')
-    Base.metadata.create_all(engine)
-    loading_session = Session()
+    Base.metadata.create_all(db_engine)
+    loading_session = sessionmaker(bind=db_engine)()
     loading_session.execute('pragma foreign_keys=on')
 
-    # Load in raw data
-    print('Reading in energy flows data...')
-    balance_metadata, balance_values = load_balance()
-    consumption, consumption_categories = load_consumption()
-
     # Populate models from raw data
     print('Populating database from file...')
 
+    # Record the full year axis, since sparse databases may have no flows at all for some years
+    print('  Adding years...')
+    for year in np.union1d(consumption[0].astype(int), balance_values[0].astype(int)):
+        loading_session.add(Year(year=int(year)))
+
     # Create resources
     print('  Adding resources...')
     resources = []
@@ -73,10 +59,16 @@ if args.load_data or args.run_all:
     loading_session.add_all(consumption_nodes)
 
     print('  Adding resource flows...')
+    flow_cells = 0
+    flows_stored = 0
 
     # Add consumption flows to db
     for n in range(1,len(consumption)):
         for year_num in range(len(consumption[n])):
+            flow_cells += 1
+            if sparse_flows and is_empty_flow(consumption[n, year_num]):
+                continue
+            flows_stored += 1
             loading_session.add(Flow(
                 resource_name = consumption_categories[n, 1],
                 source_node_name = 'Annual (Short-Term) Stock',
@@ -88,6 +80,10 @@ if args.load_data or args.run_all:
     # Add balance flows to db
     for n in range(1, len(balance_values)):
         for year_num in range(len(balance_values[n])):
+            flow_cells += 1
+            if sparse_flows and is_empty_flow(balance_values[n, year_num]):
+                continue
+            flows_stored += 1
             loading_session.add(Flow(
                 resource_name = balance_metadata[n, 1],
                 source_node_name = balance_metadata[n, 2],
@@ -96,269 +92,344 @@ if args.load_data or args.run_all:
                 year = int(balance_values[0, year_num])
             ))
 
-    print('Database loaded successfully.')
     loading_session.commit()
     loading_session.close()
 
-if args.generate_plots or args.run_all:
-
-    gdp = load_gdp()
-    session = Session()
-
-    def first(iterable):
-            return iterable[0]
-
-    def custom_colourize(plot, resources):
-            colour_map = {
-                    'Biofuels and waste': 'darkolivegreen',
-                    'Coal': 'saddlebrown',
-                    'Electricity': 'dodgerblue',
-                    'Geothermal': 'firebrick',
-                    'Heat': 'salmon',
-                    'Hydro': 'blue',
-                    'Natural gas': 'darkkhaki',
-                    'Nuclear': 'greenyellow',
-                    'Oil': 'black',
-                    'Oil products': 'dimgrey',
-                    'Solar/tide/wind': 'yellow'
+    return flow_cells, flows_stored
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Loads, stores, and summarizes national energy flow data')
+
+    parser.add_argument('--load-data', help="Loads in national data from balance.txt and consumption.txt in current directory, saving it out to eflows.db", action="store_true")
+    parser.add_argument('--generate-plots', help="Generates Sankey diagrams and time-series plots based on data stored in eflows.db", action="store_true")
+    parser.add_argument('--compile-report', help="Generates summary PDF with balance tables, Sankey diagrams, etc based on data stored in eflows.db and pre-generated SVG plots", action="store_true")
+    parser.add_argument('--sparse-flows', help="When loading data, only stores non-zero flows (zero and empty cells are skipped and read back as 0.0)", action="store_true")
+    parser.add_argument('--flow-storage-report', help="Loads the national data into temporary dense and sparse databases and reports their flow row counts and (vacuumed) file sizes", action="store_true")
+    parser.add_argument('--run-all', help="Loads data into database, generates plots, and outputs summary report PDF", action="store_true")
+
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite:///eflows.db')
+    Session = sessionmaker(bind=engine)
+
+    report_years = [1973, 1990, 2010, 2030, 2050]
+
+    if args.load_data or args.run_all:
+
+        # Load in raw data
+        print('Reading in energy flows data...')
+        balance_metadata, balance_values = load_balance()
+        consumption, consumption_categories = load_consumption()
+
+        flow_cells, flows_stored = populate_database(engine, balance_metadata, balance_values, consumption, consumption_categories, args.sparse_flows)
+
+        print('Database loaded successfully.')
+        print('  Stored %d of %d flow cells (%d zero / empty cells skipped)' % (flows_stored, flow_cells, flow_cells - flows_stored))
+
+    if args.flow_storage_report:
+
+        print('Reading in energy flows data...')
+        balance_metadata, balance_values = load_balance()
+        consumption, consumption_categories = load_consumption()
+
+        # Build both layouts from the same data, vacuumed, so their file sizes are directly comparable
+        report_dir = tempfile.mkdtemp()
+        storage = {}
+        try:
+            for layout, sparse_flows in [('dense', False), ('sparse', True)]:
+                print('Building %s flow database...' % layout)
+                db_path = os.path.join(report_dir, '%s.db' % layout)
+                db_engine = create_engine('sqlite:///%s' % db_path)
+                flow_cells, flows_stored = populate_database(db_engine, balance_metadata, balance_values, consumption, consumption_categories, sparse_flows)
+                db_engine.execute('vacuum')
+                db_engine.dispose()
+                storage[layout] = (flows_stored, os.path.getsize(db_path))
+        finally:
+            shutil.rmtree(report_dir)
+
+        dense_rows, dense_size = storage['dense']
+        sparse_rows, sparse_size = storage['sparse']
+        print('Flow storage report:')
+        print('  dense:  %d flow rows, %.1f KB' % (dense_rows, dense_size / 1024.))
+        print('  sparse: %d flow rows, %.1f KB' % (sparse_rows, sparse_size / 1024.))
+        print('  reduction: %.1f%% fewer rows, %.1f%% smaller file' % (
+            100. * (dense_rows - sparse_rows) / dense_rows if dense_rows else 0.,
+            100. * (dense_size - sparse_size) / dense_size if dense_size else 0.))
+
+    if args.generate_plots or args.run_all:
+
+        gdp = load_gdp()
+        session = Session()
+
+        def first(iterable):
+                return iterable[0]
+
+        def year_series(rows):
+                # Zero-fill (year, volume) rows onto the full year axis, as sparse databases omit zero flows
+                volumes_by_year = dict(rows)
+                return np.array([volumes_by_year.get(year, 0.) for year in years])
+
+        def custom_colourize(plot, resources):
+                colour_map = {
+                        'Biofuels and waste': 'darkolivegreen',
+                        'Coal': 'saddlebrown',
+                        'Electricity': 'dodgerblue',
+                        'Geothermal': 'firebrick',
+                        'Heat': 'salmon',
+                        'Hydro': 'blue',
+                        'Natural gas': 'darkkhaki',
+                        'Nuclear': 'greenyellow',
+                        'Oil': 'black',
+                        'Oil products': 'dimgrey',
+                        'Solar/tide/wind': 'yellow'
+                }
+                for resource_num in range(len(resources)):
+                        plot[resource_num].set_facecolor(colour_map[resources[resource_num]]) 
+
+        print('Generating summary plots...')
+
+        carbon_emissions = np.zeros(np.shape(gdp))
+        print(np.shape(carbon_emissions))
+
+        def emissions(resource):
+
+            emissions_values = {
+                    'Coal': 86500,
+                    'Natural gas': 49900,
+                    'Oil products': 70600 
             }
-            for resource_num in range(len(resources)):
-                    plot[resource_num].set_facecolor(colour_map[resources[resource_num]]) 
-
-    print('Generating summary plots...')
-
-    carbon_emissions = np.zeros(np.shape(gdp))
-    print(np.shape(carbon_emissions))
-
-    def emissions(resource):
-
-        emissions_values = {
-                'Coal': 86500,
-                'Natural gas': 49900,
-                'Oil products': 70600 
-        }
-
-        return emissions_values.get(resource, 0)
-
-
-    print('  Generating primary energy production plot...')
-    years = session.query(Flow.year.distinct()).order_by(Flow.year).all() 
-    years = np.array(list(map(first, years)))
-    resources = tf.resources(None)
-
-    volumes_primary = []
-    resources_primary = []
-
-    for resource in resources:
-            volumes = session.query(Flow.volume).filter(Flow.source_node_name=='Primary Production', Flow.resource_name==resource).order_by(Flow.year).all()
-            if len(volumes):
-                resources_primary.append(resource)
-                volumes_primary.append(np.array(list(map(first, volumes))))
-
-    fig, ax = plt.subplots()
-    fig.set_size_inches(8, 3.1)
-    sp = ax.stackplot(years, np.row_stack(tuple(volumes_primary)), lw=0.0)
-    ax.tick_params(axis='both', which='minor', labelsize=8)
-    custom_colourize(sp, resources_primary)
-    plt.tick_params(labelsize=8)
-    plt.title('Primary Energy Production', fontsize=10)
-    plt.ylabel('Petajoules', fontsize=8)
-    legend_proxy_rects = [Rectangle((0, 0), 1, 1, fc=pc.get_facecolor()[0], lw=0) for pc in sp]
-    plt.legend(legend_proxy_rects, resources_primary, loc='upper left', fontsize=8, frameon=False)
-    plt.savefig('primary_production.svg', format='svg', bbox_inches='tight') 
-
-    print('  Generating electricity fuel mix plot...')
-    power_fuel_volumes = []
-    power_fuel_names = []
-
-    for resource in resources:
-            volumes = session.query(Flow.volume).filter(Flow.sink_node_name=='Power Plants', Flow.resource_name==resource).order_by(Flow.year).all()
-            if len(volumes):
-                power_fuel_names.append(resource)
-                power_fuel_volumes.append(np.array(list(map(first, volumes))))
-                carbon_emissions = np.add(carbon_emissions, np.array(list(map(first, volumes)))*emissions(resource))
-
-    fig, ax = plt.subplots()
-    fig.set_size_inches(8, 3.1)
-    sp = ax.stackplot(years, np.row_stack(tuple(power_fuel_volumes)), lw=0.0)
-    custom_colourize(sp, power_fuel_names)
-    plt.tick_params(labelsize=8)
-    plt.title('Electricity Generation Input Fuel Mix', fontsize=10)
-    plt.ylabel('Petajoules', fontsize=8)
-    legend_proxy_rects = [Rectangle((0, 0), 1, 1, fc=pc.get_facecolor()[0], lw=0) for pc in sp]
-    plt.legend(legend_proxy_rects, power_fuel_names, loc='upper left', fontsize=8, frameon=False)
-    plt.savefig('electricity_fuel.svg', format='svg', bbox_inches='tight') 
-
-
-    print('  Generating delivered energy mix plot')
-    delivered_volumes = []
-    delivered_names = []
-
-    for resource in resources:
-            volumes = session.execute("select sum(flows.volume) from flows, nodes where flows.resource_name='%s' and flows.sink_node_name = nodes.name and nodes.sector_name is not null group by year" % resource).fetchall()
-            if len(volumes):
-                delivered_names.append(resource)
-                delivered_volumes.append(np.array(list(map(first, volumes))))
-                carbon_emissions = np.add(carbon_emissions, np.array(list(map(first, volumes)))*emissions(resource))
-
-    fig, ax = plt.subplots()
-    fig.set_size_inches(8, 3.1)
-    sp = ax.stackplot(years, np.row_stack(tuple(delivered_volumes)), lw=0.0)
-    custom_colourize(sp, delivered_names)
-    plt.tick_params(labelsize=8)
-    plt.title('Delivered Energy Product Mix', fontsize=10)
-    plt.ylabel('Petajoules', fontsize=8)
-    legend_proxy_rects = [Rectangle((0, 0), 1, 1, fc=pc.get_facecolor()[0], lw=0) for pc in sp]
-    plt.legend(legend_proxy_rects, delivered_names, loc='upper left', fontsize=8, frameon=False)
-    plt.savefig('delivered_consumption.svg', format='svg', bbox_inches='tight') 
-
-    print('  Generating energy imports plot')
-    imported_volumes = []
-    imported_names = []
-
-    for resource in resources:
-            volumes = session.execute("select sum(flows.volume) from flows where flows.resource_name='%s' and flows.source_node_name = 'Imports' group by year order by year" % resource).fetchall()
-            if len(volumes):
-                imported_names.append(resource)
-                imported_volumes.append(np.array(list(map(first, volumes))))
-
-    fig, ax = plt.subplots()
-    fig.set_size_inches(8, 3.1)
-    sp = ax.stackplot(years, np.row_stack(tuple(imported_volumes)), lw=0.0)
-    custom_colourize(sp, imported_names)
-    plt.tick_params(labelsize=8)
-    plt.title('Energy Imports', fontsize=10)
-    plt.ylabel('Petajoules', fontsize=8)
-    legend_proxy_rects = [Rectangle((0, 0), 1, 1, fc=pc.get_facecolor()[0], lw=0) for pc in sp]
-    plt.legend(legend_proxy_rects, imported_names, loc='upper left', fontsize=8, frameon=False)
-    plt.savefig('imports.svg', format='svg', bbox_inches='tight') 
-
-
-    print('  Generating energy intensity plot')
-
-    volumes = session.execute("select sum(flows.volume) from nodes, flows where flows.sink_node_name = nodes.name and nodes.sector_name is not null group by flows.year order by flows.year").fetchall()
-    volumes = np.array(list(map(first, volumes)))*1000 #Terajoules
-    gdp_intensity = np.divide(volumes, gdp) # Terajoules / MegaGDP = Megajoules / GDP
-
-    fig, ax = plt.subplots()
-    fig.set_size_inches(8, 3.1)
-    ax.plot(years, gdp_intensity)
-    plt.tick_params(labelsize=8)
-    plt.title('Energy Intensity', fontsize=10)
-    plt.ylabel('Megajoules per unit GDP', fontsize=8)
-    #legend_proxy_rects = [Rectangle((0, 0), 1, 1, fc=pc.get_facecolor()[0], lw=0) for pc in sp]
-    #plt.legend(legend_proxy_rects, imported_names, loc='upper left', fontsize=8, frameon=False)
-    plt.savefig('energy_intensity.svg', format='svg', bbox_inches='tight') 
-
-    print('  Generating carbon intensity plot')
-
-    volumes = session.execute("select sum(flows.volume) from nodes, flows where flows.sink_node_name = nodes.name and nodes.sector_name is not null group by flows.year order by flows.year").fetchall()
-    volumes = np.array(list(map(first, volumes)))
-    carbon_intensity = np.divide(carbon_emissions, volumes)
-
-    fig, ax = plt.subplots()
-    fig.set_size_inches(8, 3.1)
-    ax.plot(years, carbon_intensity)
-    plt.tick_params(labelsize=8)
-    plt.title('Carbon Intensity', fontsize=10)
-    plt.ylabel('MT CO2 per PJ converted or consumed', fontsize=8)
-    #legend_proxy_rects = [Rectangle((0, 0), 1, 1, fc=pc.get_facecolor()[0], lw=0) for pc in sp]
-    #plt.legend(legend_proxy_rects, imported_names, loc='upper left', fontsize=8, frameon=False)
-    plt.savefig('carbon_intensity.svg', format='svg', bbox_inches='tight') 
+
+            return emissions_values.get(resource, 0)
+
+
+        print('  Generating primary energy production plot...')
+        years = session.query(Year.year).order_by(Year.year).all()
+        years = np.array(list(map(first, years)))
+        resources = tf.resources(None)
+
+        volumes_primary = []
+        resources_primary = []
+
+        for resource in resources:
+                volumes = session.query(Flow.year, func.sum(Flow.volume)).filter(Flow.source_node_name=='Primary Production', Flow.resource_name==resource).group_by(Flow.year).all()
+                series = year_series(volumes)
+                if series.any():
+                    resources_primary.append(resource)
+                    volumes_primary.append(series)
+
+        fig, ax = plt.subplots()
+        fig.set_size_inches(8, 3.1)
+        sp = ax.stackplot(years, np.row_stack(tuple(volumes_primary)), lw=0.0)
+        ax.tick_params(axis='both', which='minor', labelsize=8)
+        custom_colourize(sp, resources_primary)
+        plt.tick_params(labelsize=8)
+        plt.title('Primary Energy Production', fontsize=10)
+        plt.ylabel('Petajoules', fontsize=8)
+        legend_proxy_rects = [Rectangle((0, 0), 1, 1, fc=pc.get_facecolor()[0], lw=0) for pc in sp]
+        plt.legend(legend_proxy_rects, resources_primary, loc='upper left', fontsize=8, frameon=False)
+        plt.savefig('primary_production.svg', format='svg', bbox_inches='tight') 
+
+        print('  Generating electricity fuel mix plot...')
+        power_fuel_volumes = []
+        power_fuel_names = []
+
+        for resource in resources:
+                volumes = session.query(Flow.year, func.sum(Flow.volume)).filter(Flow.sink_node_name=='Power Plants', Flow.resource_name==resource).group_by(Flow.year).all()
+                series = year_series(volumes)
+                if series.any():
+                    power_fuel_names.append(resource)
+                    power_fuel_volumes.append(series)
+                    carbon_emissions = np.add(carbon_emissions, series*emissions(resource))
+
+        fig, ax = plt.subplots()
+        fig.set_size_inches(8, 3.1)
+        sp = ax.stackplot(years, np.row_stack(tuple(power_fuel_volumes)), lw=0.0)
+        custom_colourize(sp, power_fuel_names)
+        plt.tick_params(labelsize=8)
+        plt.title('Electricity Generation Input Fuel Mix', fontsize=10)
+        plt.ylabel('Petajoules', fontsize=8)
+        legend_proxy_rects = [Rectangle((0, 0), 1, 1, fc=pc.get_facecolor()[0], lw=0) for pc in sp]
+        plt.legend(legend_proxy_rects, power_fuel_names, loc='upper left', fontsize=8, frameon=False)
+        plt.savefig('electricity_fuel.svg', format='svg', bbox_inches='tight') 
+
+
+        print('  Generating delivered energy mix plot')
+        delivered_volumes = []
+        delivered_names = []
+
+        for resource in resources:
+                volumes = session.execute("select flows.year, sum(flows.volume) from flows, nodes where flows.resource_name='%s' and flows.sink_node_name = nodes.name and nodes.sector_name is not null group by flows.year" % resource).fetchall()
+                series = year_series(volumes)
+                if series.any():
+                    delivered_names.append(resource)
+                    delivered_volumes.append(series)
+                    carbon_emissions = np.add(carbon_emissions, series*emissions(resource))
+
+        fig, ax = plt.subplots()
+        fig.set_size_inches(8, 3.1)
+        sp = ax.stackplot(years, np.row_stack(tuple(delivered_volumes)), lw=0.0)
+        custom_colourize(sp, delivered_names)
+        plt.tick_params(labelsize=8)
+        plt.title('Delivered Energy Product Mix', fontsize=10)
+        plt.ylabel('Petajoules', fontsize=8)
+        legend_proxy_rects = [Rectangle((0, 0), 1, 1, fc=pc.get_facecolor()[0], lw=0) for pc in sp]
+        plt.legend(legend_proxy_rects, delivered_names, loc='upper left', fontsize=8, frameon=False)
+        plt.savefig('delivered_consumption.svg', format='svg', bbox_inches='tight') 
+
+        print('  Generating energy imports plot')
+        imported_volumes = []
+        imported_names = []
+
+        for resource in resources:
+                volumes = session.execute("select flows.year, sum(flows.volume) from flows where flows.resource_name='%s' and flows.source_node_name = 'Imports' group by flows.year" % resource).fetchall()
+                series = year_series(volumes)
+                if series.any():
+                    imported_names.append(resource)
+                    imported_volumes.append(series)
+
+        fig, ax = plt.subplots()
+        fig.set_size_inches(8, 3.1)
+        sp = ax.stackplot(years, np.row_stack(tuple(imported_volumes)), lw=0.0)
+        custom_colourize(sp, imported_names)
+        plt.tick_params(labelsize=8)
+        plt.title('Energy Imports', fontsize=10)
+        plt.ylabel('Petajoules', fontsize=8)
+        legend_proxy_rects = [Rectangle((0, 0), 1, 1, fc=pc.get_facecolor()[0], lw=0) for pc in sp]
+        plt.legend(legend_proxy_rects, imported_names, loc='upper left', fontsize=8, frameon=False)
+        plt.savefig('imports.svg', format='svg', bbox_inches='tight') 
+
+
+        print('  Generating energy intensity plot')
+
+        volumes = session.execute("select flows.year, sum(flows.volume) from nodes, flows where flows.sink_node_name = nodes.name and nodes.sector_name is not null group by flows.year").fetchall()
+        volumes = year_series(volumes)*1000 #Terajoules
+        gdp_intensity = np.divide(volumes, gdp) # Terajoules / MegaGDP = Megajoules / GDP
+
+        fig, ax = plt.subplots()
+        fig.set_size_inches(8, 3.1)
+        ax.plot(years, gdp_intensity)
+        plt.tick_params(labelsize=8)
+        plt.title('Energy Intensity', fontsize=10)
+        plt.ylabel('Megajoules per unit GDP', fontsize=8)
+        #legend_proxy_rects = [Rectangle((0, 0), 1, 1, fc=pc.get_facecolor()[0], lw=0) for pc in sp]
+        #plt.legend(legend_proxy_rects, imported_names, loc='upper left', fontsize=8, frameon=False)
+        plt.savefig('energy_intensity.svg', format='svg', bbox_inches='tight') 
+
+        print('  Generating carbon intensity plot')
+
+        volumes = session.execute("select flows.year, sum(flows.volume) from nodes, flows where flows.sink_node_name = nodes.name and nodes.sector_name is not null group by flows.year").fetchall()
+        volumes = year_series(volumes)
+        carbon_intensity = np.divide(carbon_emissions, volumes)
+
+        fig, ax = plt.subplots()
+        fig.set_size_inches(8, 3.1)
+        ax.plot(years, carbon_intensity)
+        plt.tick_params(labelsize=8)
+        plt.title('Carbon Intensity', fontsize=10)
+        plt.ylabel('MT CO2 per PJ converted or consumed', fontsize=8)
+        #legend_proxy_rects = [Rectangle((0, 0), 1, 1, fc=pc.get_facecolor()[0], lw=0) for pc in sp]
+        #plt.legend(legend_proxy_rects, imported_names, loc='upper left', fontsize=8, frameon=False)
+        plt.savefig('carbon_intensity.svg', format='svg', bbox_inches='tight') 
    
-    # Generate relevant Sankey diagrams
-    for year in report_years:
-
-        print('  Generating %s Sankey diagram...' % year)
-        imports = tf.total_from_node(None, 'Imports', year) 
-        production = tf.total_from_node(None, 'Primary Production', year) 
-        stock_changes =  tf.total_from_node(None, 'Long-Term Stock Changes', year) - tf.total_into_node(None, 'Long-Term Stock Changes', year)
-        bunkers =  tf.total_from_node(None, 'Bunkers', year) - tf.total_into_node(None, 'Bunkers', year)
-        exports = tf.total_into_node(None, 'Exports', year) 
-        losses = tf.total_into_node(None, 'Power losses', year) + tf.total_into_node(None, 'Own use', year)
-        consumption = tf.total_final_consumption(None, year) 
-        stat_diffs =  tf.total_from_node(None, 'Statistical Differences', year) - tf.total_into_node(None, 'Statistical Differences', year)
-
-        norm_const = imports + production + tf.total_from_node(None, 'Long-Term Stock Changes', year) + tf.total_from_node(None, 'Statistical Differences', year)
-
-        production_flows_full = session.query(Flow).filter(Flow.source_node_name=='Primary Production', Flow.year==year, Flow.volume > 1).all()
-
-        num_resources = len(production_flows_full)
-        production_resource_names = []
-        production_resource_volumes = []
-
-        for flow in production_flows_full:
-                production_resource_names.append(flow.resource_name)
-                production_resource_volumes.append(flow.volume) 
-
-        cons_industry = tf.total_into_sector(None, 'Industry', year) 
-        cons_transport = tf.total_into_sector(None, 'Transport', year) 
-        cons_other = tf.total_into_sector(None, 'Other', year)
-        cons_other_residential = tf.total_into_node(None, 'Residential', year)
-        cons_other_comm_public = tf.total_into_node(None, 'Commerce and public services', year)
-        cons_other_other = cons_other - cons_other_residential - cons_other_comm_public
-        cons_non_energy_use = tf.total_into_sector(None, 'Non-energy use', year)
-
-
-        fig = plt.figure(figsize=(8,5), dpi=300)
-        ax = fig.add_subplot(1, 1, 1, xticks=[], yticks=[])
-        ax.axis('off')
-
-        sankey = Sankey(ax=ax, scale=2/norm_const, format='%.1f', unit=' PJ', head_angle=120, margin=0.2, shoulder=0, offset=-0.1, gap=0.15, radius=0.1)
-
-        diagrams = sankey.add(
-                flows=production_resource_volumes + [-production],
-                labels=production_resource_names + [None],
-                orientations=[1 if x<num_resources/2 else -1 for x in range(num_resources)] + [0],
-                pathlengths=[0.1 for x in range(num_resources)] + [-0.00],
-                trunklength=0.2
+        # Generate relevant Sankey diagrams
+        for year in report_years:
+
+            print('  Generating %s Sankey diagram...' % year)
+            imports = tf.total_from_node(None, 'Imports', year) 
+            production = tf.total_from_node(None, 'Primary Production', year) 
+            stock_changes =  tf.total_from_node(None, 'Long-Term Stock Changes', year) - tf.total_into_node(None, 'Long-Term Stock Changes', year)
+            bunkers =  tf.total_from_node(None, 'Bunkers', year) - tf.total_into_node(None, 'Bunkers', year)
+            exports = tf.total_into_node(None, 'Exports', year) 
+            losses = tf.total_into_node(None, 'Power losses', year) + tf.total_into_node(None, 'Own use', year)
+            consumption = tf.total_final_consumption(None, year) 
+            stat_diffs =  tf.total_from_node(None, 'Statistical Differences', year) - tf.total_into_node(None, 'Statistical Differences', year)
+
+            norm_const = imports + production + tf.total_from_node(None, 'Long-Term Stock Changes', year) + tf.total_from_node(None, 'Statistical Differences', year)
+
+            production_flows_full = session.query(Flow).filter(Flow.source_node_name=='Primary Production', Flow.year==year, Flow.volume > 1).all()
+
+            num_resources = len(production_flows_full)
+            production_resource_names = []
+            production_resource_volumes = []
+
+            for flow in production_flows_full:
+                    production_resource_names.append(flow.resource_name)
+                    production_resource_volumes.append(flow.volume) 
+
+            cons_industry = tf.total_into_sector(None, 'Industry', year) 
+            cons_transport = tf.total_into_sector(None, 'Transport', year) 
+            cons_other = tf.total_into_sector(None, 'Other', year)
+            cons_other_residential = tf.total_into_node(None, 'Residential', year)
+            cons_other_comm_public = tf.total_into_node(None, 'Commerce and public services', year)
+            cons_other_other = cons_other - cons_other_residential - cons_other_comm_public
+            cons_non_energy_use = tf.total_into_sector(None, 'Non-energy use', year)
+
+
+            fig = plt.figure(figsize=(8,5), dpi=300)
+            ax = fig.add_subplot(1, 1, 1, xticks=[], yticks=[])
+            ax.axis('off')
+
+            sankey = Sankey(ax=ax, scale=2/norm_const, format='%.1f', unit=' PJ', head_angle=120, margin=0.2, shoulder=0, offset=-0.1, gap=0.15, radius=0.1)
+
+            diagrams = sankey.add(
+                    flows=production_resource_volumes + [-production],
+                    labels=production_resource_names + [None],
+                    orientations=[1 if x<num_resources/2 else -1 for x in range(num_resources)] + [0],
+                    pathlengths=[0.1 for x in range(num_resources)] + [-0.00],
+                    trunklength=0.2
                 
-        ).add(
-                flows=[imports, production, stock_changes, bunkers, -exports, -losses, -consumption, stat_diffs],
-                labels = ['Imports', 'Total Primary\nProduction', 'Stock Changes', 'International\nBunkers', 'Exports', 'Own Use &\nPower Losses', None, 'Statistical\n Differences'],
-                orientations=[1, 0, -1, 1, 1, -1, 0, -1],
-                pathlengths = [0.2, 0.0, 0.3, 0.3, 0.2, 0.3, -0.2, 0.4],
-                trunklength=0.4,
-                prior=0,
-                connect=(num_resources, 1)
-        ).add(
-                flows=[consumption, -cons_industry, -cons_transport, -cons_non_energy_use, -cons_other],
-                labels=[None, 'Industry', 'Transportation', 'Non-Energy Use', None],
-                orientations=[0, 1, 1, -1, 0],
-                pathlengths=[0.3, 0.1, 0.1, 0.1, -0.1],
-                trunklength=0.2,
-                prior=1,
-                connect=(6,0), 
-        ).add(
-                flows=[cons_other, -cons_other_residential, -cons_other_comm_public, -cons_other_other],
-                labels=[None, 'Residential', 'Commerce and\nPublic Services', 'Other'],
-                orientations=[0, 0, 1, -1],
-                pathlengths=[0.1, 0.1, 0.1, 0.1],
-                trunklength=0.2,
-                prior=2,
-                connect=(4,0)
-        ).finish()
-
-        for diagram in diagrams:
-            diagram.patch.set_facecolor('#dddddd')
-            diagram.patch.set_edgecolor('#dddddd')
-            for text in diagram.texts:
-                    text.set_fontsize(5)
-
-        plt.savefig('sankey_%s.svg' % year, format='svg', bbox_inches='tight', pad_inches=0)
-
-        session.close()
-
-
-if args.compile_report or args.run_all:
-    print('Compiling report:')
-
-    print('  Generating balance tables...')
-    energy_balance_template = Template(filename='templates/balances.html')
-
-    print('  Compiling final output...')
-    HTML(string=energy_balance_template.render(years=report_years)).write_pdf('balances.pdf')
-
-    print('Report output completed successfully.')
+            ).add(
+                    flows=[imports, production, stock_changes, bunkers, -exports, -losses, -consumption, stat_diffs],
+                    labels = ['Imports', 'Total Primary\nProduction', 'Stock Changes', 'International\nBunkers', 'Exports', 'Own Use &\nPower Losses', None, 'Statistical\n Differences'],
+                    orientations=[1, 0, -1, 1, 1, -1, 0, -1],
+                    pathlengths = [0.2, 0.0, 0.3, 0.3, 0.2, 0.3, -0.2, 0.4],
+                    trunklength=0.4,
+                    prior=0,
+                    connect=(num_resources, 1)
+            ).add(
+                    flows=[consumption, -cons_industry, -cons_transport, -cons_non_energy_use, -cons_other],
+                    labels=[None, 'Industry', 'Transportation', 'Non-Energy Use', None],
+                    orientations=[0, 1, 1, -1, 0],
+                    pathlengths=[0.3, 0.1, 0.1, 0.1, -0.1],
+                    trunklength=0.2,
+                    prior=1,
+                    connect=(6,0), 
+            ).add(
+                    flows=[cons_other, -cons_other_residential, -cons_other_comm_public, -cons_other_other],
+                    labels=[None, 'Residential', 'Commerce and\nPublic Services', 'Other'],
+                    orientations=[0, 0, 1, -1],
+                    pathlengths=[0.1, 0.1, 0.1, 0.1],
+                    trunklength=0.2,
+                    prior=2,
+                    connect=(4,0)
+            ).finish()
+
+            for diagram in diagrams:
+                diagram.patch.set_facecolor('#dddddd')
+                diagram.patch.set_edgecolor('#dddddd')
+                for text in diagram.texts:
+                        text.set_fontsize(5)
+
+            plt.savefig('sankey_%s.svg' % year, format='svg', bbox_inches='tight', pad_inches=0)
+
+            session.close()
+
+
+    if args.compile_report or args.run_all:
+        print('Compiling report:')
+
+        print('  Generating balance tables...')
+        energy_balance_template = Template(filename='templates/balances.html')
+
+        # Chart pages and each year's balance table are laid out as independent sections
+        sections = [energy_balance_template.render(years=[], charts=True)]
+        for year in report_years:
+            sections.append(energy_balance_template.render(years=[year], charts=False))
+
+        print('  Compiling final output...')
+        compile_sections(sections, 'balances.pdf')
+
+        print('Report output completed successfully.')
 
 
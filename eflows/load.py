@@ -206,6 +206,11 @@ def load_balance(annual_stock_name='Annual (Short-Term) Stock'):
 
     return balance_metadata, balance_values
 
+def is_empty_flow(value):
+    # Blank cells and zero volumes carry no flow and can be left out of sparse databases
+    value = value.strip()
+    return value == '' or float(value) == 0.
+
 def load_gdp():
     country_data= np.loadtxt(open('PopulationGDP.csv', 'rb'), delimiter=',', dtype=bytes).astype(str)
     gdp = country_data[1:,1].astype(float)
@@ -50,6 +50,14 @@ resource_sink_nodes = Table(
     Column('node_name', String, ForeignKey('nodes.name'))
 )
 
+class Year(Base):
+    __tablename__ = 'years'
+
+    year = Column(Integer, primary_key=True)
+
+    def __repr__(self):
+        return "<Year %s>" % (self.year)
+
 class Flow(Base):
     __tablename__ = 'flows'
 
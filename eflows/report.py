@@ -0,0 +1,54 @@
+import hashlib, os, re, tempfile
+from multiprocessing import Pool
+from weasyprint import HTML
+from pypdf import PdfWriter
+
+def section_key(html):
+    # Sections depend on their rendered markup and on the contents of any SVGs they embed
+    key = hashlib.sha1(html.encode('utf-8'))
+    for path in re.findall('src="file://([^"]+)"', html):
+        if os.path.exists(path):
+            with open(path, 'rb') as svg:
+                key.update(svg.read())
+    return key.hexdigest()
+
+def layout_section(html):
+    return HTML(string=html).write_pdf()
+
+def cache_section(path, pdf):
+    # Write alongside the final path and move into place, so an interrupted run never leaves a truncated PDF under a valid key
+    fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as temp:
+            temp.write(pdf)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+def compile_sections(sections, output, cache_dir='.report_cache'):
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    cache_paths = [os.path.join(cache_dir, '%s.pdf' % section_key(html)) for html in sections]
+    stale = [n for n in range(len(sections)) if not os.path.exists(cache_paths[n])]
+    print('  Laying out %d of %d report sections (%d cached)...' % (len(stale), len(sections), len(sections) - len(stale)))
+
+    if stale:
+        with Pool() as pool:
+            pdfs = pool.map(layout_section, [sections[n] for n in stale])
+        for n, pdf in zip(stale, pdfs):
+            cache_section(cache_paths[n], pdf)
+
+    writer = PdfWriter()
+    for path in cache_paths:
+        writer.append(path)
+    with open(output, 'wb') as pdf:
+        writer.write(pdf)
+
+    # Only the current sections are worth keeping; drop superseded sections and abandoned temp files
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if path not in cache_paths:
+            os.remove(path)